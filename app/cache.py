@@ -1,70 +1,265 @@
 """
-Simple in-memory cache for API responses
-Can be replaced with Redis for production
+Cache for API responses
+In-memory by default; set REDIS_URL to share one cache across workers
 """
-from datetime import datetime, timedelta
-from typing import Optional, Any
-import hashlib
-import json
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from threading import RLock
+from typing import Optional, Any, Hashable
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+import orjson
+import redis
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+# Seconds to wait on Redis before treating the call as a miss (keeps requests
+# fast when Redis is slow or unreachable)
+REDIS_SOCKET_TIMEOUT = 0.25
 
 class SimpleCache:
-    """Simple in-memory cache with TTL"""
+    """Simple in-memory LRU cache with TTL and a bounded number of entries
+
+    Thread-safe: sync endpoints run in uvicorn's threadpool, so every
+    check-then-mutate sequence is guarded by a single lock.
+    """
     
-    def __init__(self, default_ttl: int = 300):  # 5 minutes default
-        self.cache = {}
+    # Operations are in-memory, so async callers may run them inline
+    blocking_io = False
+
+    def __init__(
+        self,
+        default_ttl: int = 300,  # 5 minutes default
+        max_entries: int = 1024,
+        cleanup_interval: int = 100
+    ):
+        self.cache = OrderedDict()
         self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.cleanup_interval = cleanup_interval
+        # Min-heap of (expiry, seq, key) so expired entries can be purged
+        # without scanning the whole cache; seq breaks ties between keys
+        self._expiry_heap = []
+        self._seq = itertools.count()
+        self._sets_since_cleanup = 0
+        self._lock = RLock()
+
+    @staticmethod
+    def make_key(prefix: str, *args, **kwargs) -> Hashable:
+        """Build cache key as a plain tuple (hashed natively by dict)"""
+        return (prefix, args, tuple(sorted(kwargs.items())))
+
+    def get(self, prefix: str, *args, **kwargs) -> Optional[Any]:
+        """Get value from cache"""
+        return self.get_by_key(self.make_key(prefix, *args, **kwargs))
+
+    def get_by_key(self, key: Hashable) -> Optional[Any]:
+        """Get value from cache using a key built by make_key"""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                value, expiry = entry
+                if time.monotonic() < expiry:
+                    # Mark as most recently used
+                    self.cache.move_to_end(key)
+                    return value
+                else:
+                    # Expired, remove it
+                    del self.cache[key]
+
+        return None
+
+    def set(self, prefix: str, value: Any, ttl: Optional[int] = None, *args, **kwargs):
+        """Set value in cache, evicting least recently used entries when full"""
+        self.set_by_key(self.make_key(prefix, *args, **kwargs), value, ttl)
+
+    def set_by_key(self, key: Hashable, value: Any, ttl: Optional[int] = None):
+        """Set value in cache using a key built by make_key"""
+        ttl = ttl or self.default_ttl
+        expiry = time.monotonic() + ttl
+
+        with self._lock:
+            self.cache[key] = (value, expiry)
+            self.cache.move_to_end(key)
+            heapq.heappush(self._expiry_heap, (expiry, next(self._seq), key))
+
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+            # Purge expired entries lazily every N inserts
+            self._sets_since_cleanup += 1
+            if self._sets_since_cleanup >= self.cleanup_interval:
+                self.cleanup_expired()
+
+    def clear(self, prefix: Optional[str] = None):
+        """Clear cache, optionally by prefix"""
+        with self._lock:
+            if prefix:
+                # Prefix is the first element of every key tuple
+                keys_to_remove = [k for k in self.cache.keys() if k[0] == prefix]
+                for key in keys_to_remove:
+                    del self.cache[key]
+            else:
+                self.cache.clear()
+                self._expiry_heap.clear()
+
+    def cleanup_expired(self):
+        """Remove expired entries"""
+        now = time.monotonic()
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                expiry, _, key = heapq.heappop(heap)
+                entry = self.cache.get(key)
+                # Skip stale heap entries for keys that were re-set or evicted
+                if entry is not None and entry[1] <= now:
+                    del self.cache[key]
+
+            # Drop heap entries for evicted keys once they pile up
+            if len(heap) > 2 * self.max_entries:
+                self._expiry_heap = [
+                    item for item in heap
+                    if item[2] in self.cache and self.cache[item[2]][1] == item[0]
+                ]
+                heapq.heapify(self._expiry_heap)
+
+            self._sets_since_cleanup = 0
+
+class RedisCache:
+    """Redis-backed cache with the same interface as SimpleCache
+
+    Shared by every uvicorn worker/pod; eviction is left to Redis's
+    maxmemory-policy. Redis errors are logged and treated as cache misses
+    so an unavailable Redis never fails a request.
+
+    Values are stored without pickle: bytes (the orjson payloads written by
+    @cached) go in as-is, anything else is orjson-encoded. A one-byte tag
+    tells the two apart on read.
+    """
+    
+    # Bump when the key layout or value encoding changes so old entries are ignored
+    KEY_VERSION = "v1"
+    
+    # Every call is a network round trip; async callers run them in a worker thread
+    blocking_io = True
+    
+    def __init__(self, url: str, default_ttl: int = 300, namespace: str = "cache"):
+        self.client = redis.Redis.from_url(
+            url,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT
+        )
+        self.default_ttl = default_ttl
+        self.namespace = namespace
+    
+    make_key = staticmethod(SimpleCache.make_key)
+    
+    def _redis_key(self, key: Hashable) -> str:
+        """Convert a make_key tuple to a Redis string key (namespace:prefix:version:params)"""
+        prefix, args, kwargs = key
+        params = [str(arg) for arg in args] + [f"{name}={value}" for name, value in kwargs]
+        return f"{self.namespace}:{prefix}:{self.KEY_VERSION}:{':'.join(params)}"
     
-    def _generate_key(self, prefix: str, *args, **kwargs) -> str:
-        """Generate cache key from arguments"""
-        key_data = {
-            'prefix': prefix,
-            'args': args,
-            'kwargs': sorted(kwargs.items())
-        }
-        key_string = json.dumps(key_data, sort_keys=True)
-        return hashlib.md5(key_string.encode()).hexdigest()
+    @staticmethod
+    def _dumps(value: Any) -> bytes:
+        if isinstance(value, bytes):
+            return b"b" + value
+        return b"j" + orjson.dumps(value)
+    
+    @staticmethod
+    def _loads(raw: bytes) -> Any:
+        if raw[:1] == b"b":
+            return raw[1:]
+        return orjson.loads(raw[1:])
     
     def get(self, prefix: str, *args, **kwargs) -> Optional[Any]:
         """Get value from cache"""
-        key = self._generate_key(prefix, *args, **kwargs)
-        
-        if key in self.cache:
-            value, expiry = self.cache[key]
-            if datetime.now() < expiry:
-                return value
-            else:
-                # Expired, remove it
-                del self.cache[key]
-        
-        return None
+        return self.get_by_key(self.make_key(prefix, *args, **kwargs))
+    
+    def get_by_key(self, key: Hashable) -> Optional[Any]:
+        """Get value from cache using a key built by make_key"""
+        try:
+            raw = self.client.get(self._redis_key(key))
+        except redis.RedisError as e:
+            logger.warning(f"Redis get failed for {key[0]}: {str(e)}")
+            return None
+        return self._loads(raw) if raw is not None else None
     
     def set(self, prefix: str, value: Any, ttl: Optional[int] = None, *args, **kwargs):
         """Set value in cache"""
-        key = self._generate_key(prefix, *args, **kwargs)
+        self.set_by_key(self.make_key(prefix, *args, **kwargs), value, ttl)
+    
+    def set_by_key(self, key: Hashable, value: Any, ttl: Optional[int] = None):
+        """Set value in cache using a key built by make_key"""
         ttl = ttl or self.default_ttl
-        expiry = datetime.now() + timedelta(seconds=ttl)
-        self.cache[key] = (value, expiry)
+        try:
+            self.client.setex(self._redis_key(key), ttl, self._dumps(value))
+        except redis.RedisError as e:
+            logger.warning(f"Redis set failed for {key[0]}: {str(e)}")
     
     def clear(self, prefix: Optional[str] = None):
         """Clear cache, optionally by prefix"""
-        if prefix:
-            # Clear all keys with this prefix (would need to track prefixes)
-            keys_to_remove = [k for k in self.cache.keys() if k.startswith(prefix)]
-            for key in keys_to_remove:
-                del self.cache[key]
-        else:
-            self.cache.clear()
+        pattern = f"{self.namespace}:{prefix}:*" if prefix else f"{self.namespace}:*"
+        try:
+            keys = list(self.client.scan_iter(match=pattern))
+            if keys:
+                self.client.delete(*keys)
+        except redis.RedisError as e:
+            logger.warning(f"Redis clear failed: {str(e)}")
     
     def cleanup_expired(self):
-        """Remove expired entries"""
-        now = datetime.now()
-        expired_keys = [
-            key for key, (_, expiry) in self.cache.items()
-            if now >= expiry
-        ]
-        for key in expired_keys:
-            del self.cache[key]
+        """No-op: Redis expires keys itself"""
+        pass
 
-# Global cache instance
-cache = SimpleCache(default_ttl=300)  # 5 minutes
+@lru_cache(maxsize=None)
+def _type_adapter(response_model: Any) -> TypeAdapter:
+    """Build (once per response model) a TypeAdapter for ORM/row objects"""
+    return TypeAdapter(response_model)
+
+def encode_response(response_model: Any, value: Any) -> Any:
+    """
+    Validate a value against its response model and dump it to plain Python data
+    Cache this instead of ORM objects so cache hits skip validation; date and
+    datetime values are left for orjson to serialize natively
+    """
+    adapter = _type_adapter(response_model)
+    return adapter.dump_python(adapter.validate_python(value, from_attributes=True))
+
+async def _run_cache_op(func, *args):
+    """Run a cache operation, off the event loop when the backend does network I/O"""
+    if cache.blocking_io:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
 
+def cached(prefix: str, response_model: Any, ttl: Optional[int] = None, key_params: tuple = ()):
+    """
+    Cache an endpoint's serialized JSON response bytes
+    The key is built once from the named endpoint parameters and reused for
+    both the lookup and the store; a hit is returned as-is with no
+    validation or serialization
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = cache.make_key(prefix, **{name: kwargs[name] for name in key_params})
+            payload = await _run_cache_op(cache.get_by_key, key)
+            if payload is None:
+                result = await func(*args, **kwargs)
+                payload = orjson.dumps(encode_response(response_model, result))
+                await _run_cache_op(cache.set_by_key, key, payload, ttl)
+            return Response(content=payload, media_type="application/json")
+        return wrapper
+    return decorator
+
+# Global cache instance
+if REDIS_URL:
+    cache = RedisCache(REDIS_URL, default_ttl=300)  # 5 minutes
+else:
+    cache = SimpleCache(default_ttl=300)  # 5 minutes
@@ -1,12 +1,19 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, insert, select, lambda_stmt
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import date, datetime, timedelta
 from typing import List, Optional
 from app import models, schemas
+import numpy as np
+
+# Hot read paths use lambda_stmt so the SQL is compiled once and cached;
+# closure variables (symbol, dates) become bound parameters
 
 def get_company(db: Session, symbol: str):
     """Get a company by symbol"""
-    return db.query(models.Company).filter(models.Company.symbol == symbol).first()
+    stmt = lambda_stmt(lambda: select(models.Company).where(models.Company.symbol == symbol))
+    return db.scalars(stmt).first()
 
 def get_companies(db: Session, skip: int = 0, limit: int = 100):
     """Get all companies"""
@@ -20,124 +27,237 @@ def create_company(db: Session, company: schemas.CompanyBase):
     db.refresh(db_company)
     return db_company
 
-def get_stock_data(
-    db: Session, 
-    symbol: str, 
+def get_existing_company_symbols(db: Session, symbols: List[str]) -> set:
+    """Get the subset of symbols that already exist, in a single IN query"""
+    rows = db.query(models.Company.symbol).filter(models.Company.symbol.in_(symbols)).all()
+    return {symbol for (symbol,) in rows}
+
+def bulk_create_companies(db: Session, companies: List[dict]) -> int:
+    """Bulk create companies with one executemany insert"""
+    if not companies:
+        return 0
+    db.execute(insert(models.Company), companies)
+    db.commit()
+    return len(companies)
+
+def _apply_stock_data_window(
+    stmt,
     days: int = 30,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None
 ):
-    """Get stock data for a symbol"""
-    query = db.query(models.StockData).filter(models.StockData.symbol == symbol)
-    
+    """Add the date window and newest-first ordering to a stock data lambda_stmt"""
     if start_date:
-        query = query.filter(models.StockData.date >= start_date)
+        stmt += lambda s: s.where(models.StockData.date >= start_date)
     if end_date:
-        query = query.filter(models.StockData.date <= end_date)
+        stmt += lambda s: s.where(models.StockData.date <= end_date)
     if not start_date and not end_date:
         # Default to last N days
         cutoff_date = date.today() - timedelta(days=days)
-        query = query.filter(models.StockData.date >= cutoff_date)
+        stmt += lambda s: s.where(models.StockData.date >= cutoff_date)
+    
+    stmt += lambda s: s.order_by(models.StockData.date.desc())
+    return stmt
+
+def get_stock_data(
+    db: Session, 
+    symbol: str, 
+    days: int = 30,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """Get stock data for a symbol"""
+    stmt = lambda_stmt(lambda: select(models.StockData).where(models.StockData.symbol == symbol))
+    stmt = _apply_stock_data_window(stmt, days, start_date, end_date)
+    return db.scalars(stmt).all()
+
+def get_stock_data_rows(
+    db: Session, 
+    symbol: str, 
+    days: int = 30,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """
+    Get stock data for a symbol as read-only row mappings
+    Uses a Core select, skipping ORM instrumentation for read-only endpoints
+    """
+    stmt = lambda_stmt(
+        lambda: select(models.StockData.__table__).where(models.StockData.symbol == symbol)
+    )
+    stmt = _apply_stock_data_window(stmt, days, start_date, end_date)
+    return db.execute(stmt).mappings().all()
+
+STOCK_COLUMNS_FIELDS = ('dates', 'open', 'high', 'low', 'close', 'volume', 'daily_return')
+
+def get_stock_data_columns(db: Session, symbol: str, days: int = 30) -> dict:
+    """
+    Get stock data for a symbol column-wise (newest first)
+    Returns {field: list} matching schemas.StockDataColumns; lists are empty when there is no data
+    """
+    stmt = lambda_stmt(
+        lambda: select(
+            models.StockData.date,
+            models.StockData.open,
+            models.StockData.high,
+            models.StockData.low,
+            models.StockData.close,
+            models.StockData.volume,
+            models.StockData.daily_return
+        ).where(models.StockData.symbol == symbol)
+    )
+    stmt = _apply_stock_data_window(stmt, days)
+    rows = db.execute(stmt).all()
+    columns = zip(*rows) if rows else [()] * len(STOCK_COLUMNS_FIELDS)
+    return {field: list(values) for field, values in zip(STOCK_COLUMNS_FIELDS, columns)}
+
+def count_stock_data_by_symbol(db: Session, symbols: List[str], days: int = 30) -> dict:
+    """Count rows in the last N days per symbol with one GROUP BY query"""
+    cutoff_date = date.today() - timedelta(days=days)
+    rows = db.query(
+        models.StockData.symbol, func.count(models.StockData.id)
+    ).filter(
+        models.StockData.symbol.in_(symbols),
+        models.StockData.date >= cutoff_date
+    ).group_by(models.StockData.symbol).all()
+    return dict(rows)
+
+STOCK_ARRAY_COLUMNS = ('date', 'close', 'open', 'high', 'low', 'volume')
+
+def get_stock_arrays(db: Session, symbol: str, days: int = 30) -> dict:
+    """
+    Get a symbol's OHLCV columns as NumPy arrays (newest first)
+    Returns {column: ndarray}; arrays are empty when there is no data
+    """
+    stmt = lambda_stmt(
+        lambda: select(
+            models.StockData.date,
+            models.StockData.close,
+            models.StockData.open,
+            models.StockData.high,
+            models.StockData.low,
+            models.StockData.volume
+        ).where(models.StockData.symbol == symbol)
+    )
+    stmt = _apply_stock_data_window(stmt, days)
+    rows = db.execute(stmt).all()
+    columns = list(zip(*rows)) if rows else [()] * len(STOCK_ARRAY_COLUMNS)
     
-    return query.order_by(models.StockData.date.desc()).all()
+    return {
+        'date': np.asarray(columns[0], dtype='datetime64[D]'),
+        'close': np.asarray(columns[1], dtype=np.float64),
+        'open': np.asarray(columns[2], dtype=np.float64),
+        'high': np.asarray(columns[3], dtype=np.float64),
+        'low': np.asarray(columns[4], dtype=np.float64),
+        'volume': np.asarray(columns[5], dtype=np.int64),
+    }
+
+def _insert_for_dialect(db: Session, model):
+    """Dialect-specific INSERT construct (supports ON CONFLICT) for SQLite/PostgreSQL"""
+    if db.get_bind().dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
+def _on_conflict_update(stmt, index_elements: List[str], columns, extra_set: Optional[dict] = None):
+    """Turn an INSERT into INSERT ... ON CONFLICT DO UPDATE for the given columns"""
+    skip = {"id", "created_at", *index_elements}
+    set_ = {c.name: c for c in stmt.excluded if c.name not in skip and c.name in columns}
+    set_.update(extra_set or {})
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+
+def _upsert(db: Session, model, values: dict, index_elements: List[str], extra_set: Optional[dict] = None):
+    """
+    Single-statement INSERT ... ON CONFLICT DO UPDATE for SQLite/PostgreSQL
+    Returns the inserted or updated ORM object
+    """
+    stmt = _insert_for_dialect(db, model).values(**values)
+    stmt = _on_conflict_update(stmt, index_elements, values, extra_set).returning(model)
+    obj = db.scalars(stmt, execution_options={"populate_existing": True}).one()
+    db.commit()
+    return obj
 
 def create_stock_data(db: Session, stock_data: schemas.StockDataBase):
     """Create or update stock data"""
-    existing = db.query(models.StockData).filter(
-        models.StockData.symbol == stock_data.symbol,
-        models.StockData.date == stock_data.date
-    ).first()
-    
-    if existing:
-        # Update existing record
-        for key, value in stock_data.dict().items():
-            setattr(existing, key, value)
-        db.commit()
-        db.refresh(existing)
-        return existing
-    else:
-        # Create new record
-        db_stock_data = models.StockData(**stock_data.dict())
-        db.add(db_stock_data)
-        db.commit()
-        db.refresh(db_stock_data)
-        return db_stock_data
+    return _upsert(db, models.StockData, stock_data.dict(), ["symbol", "date"])
 
 def bulk_create_stock_data(db: Session, stock_data_list: List[schemas.StockDataBase]):
     """Bulk create stock data"""
-    db_objects = [models.StockData(**data.dict()) for data in stock_data_list]
-    db.bulk_insert_mappings(
-        models.StockData,
-        [obj.__dict__ for obj in db_objects]
+    if not stock_data_list:
+        return 0
+    # Core executemany insert - skips building throwaway ORM objects per row
+    db.execute(
+        insert(models.StockData),
+        [data.dict() for data in stock_data_list]
     )
     db.commit()
-    return len(db_objects)
+    return len(stock_data_list)
+
+def bulk_upsert_stock_data(db: Session, records: List[dict]) -> int:
+    """
+    Bulk create or update stock data from already-validated record dicts
+    One executemany INSERT ... ON CONFLICT (symbol, date) DO UPDATE
+    """
+    if not records:
+        return 0
+    stmt = _on_conflict_update(
+        _insert_for_dialect(db, models.StockData), ["symbol", "date"], records[0].keys()
+    )
+    db.execute(stmt, records)
+    db.commit()
+    return len(records)
 
 def get_stock_summary(db: Session, symbol: str):
     """Get stock summary for a symbol"""
-    return db.query(models.StockSummary).filter(models.StockSummary.symbol == symbol).first()
+    stmt = lambda_stmt(lambda: select(models.StockSummary).where(models.StockSummary.symbol == symbol))
+    return db.scalars(stmt).first()
 
 def create_or_update_stock_summary(db: Session, summary: schemas.StockSummaryBase):
     """Create or update stock summary"""
-    existing = db.query(models.StockSummary).filter(
-        models.StockSummary.symbol == summary.symbol
-    ).first()
-    
-    if existing:
-        for key, value in summary.dict().items():
-            setattr(existing, key, value)
-        db.commit()
-        db.refresh(existing)
-        return existing
-    else:
-        db_summary = models.StockSummary(**summary.dict())
-        db.add(db_summary)
-        db.commit()
-        db.refresh(db_summary)
-        return db_summary
+    # onupdate doesn't fire for ON CONFLICT, so bump last_updated explicitly
+    return _upsert(
+        db, models.StockSummary, summary.dict(), ["symbol"],
+        extra_set={"last_updated": func.now()}
+    )
+
+def _latest_stock_data_subquery():
+    """Latest row per symbol, ranked with ROW_NUMBER() OVER (PARTITION BY symbol)"""
+    # Only the columns the insights endpoint reads
+    return select(
+        models.StockData.symbol,
+        models.StockData.date,
+        models.StockData.close,
+        models.StockData.daily_return,
+        models.StockData.volatility_score,
+        func.row_number().over(
+            partition_by=models.StockData.symbol,
+            order_by=models.StockData.date.desc()
+        ).label('rn')
+    ).subquery()
 
 def get_top_gainers_losers(db: Session, limit: int = 10):
     """Get top gainers and losers based on daily return"""
-    # Get most recent date for each symbol
-    subquery = db.query(
-        models.StockData.symbol,
-        func.max(models.StockData.date).label('max_date')
-    ).group_by(models.StockData.symbol).subquery()
-    
-    # Get latest data with daily return
-    latest_data = db.query(models.StockData).join(
-        subquery,
-        (models.StockData.symbol == subquery.c.symbol) &
-        (models.StockData.date == subquery.c.max_date)
-    ).filter(models.StockData.daily_return.isnot(None)).all()
+    latest = _latest_stock_data_subquery()
     
-    # Sort by daily return
-    sorted_data = sorted(latest_data, key=lambda x: x.daily_return or 0, reverse=True)
+    # Top-N sort happens in SQL rather than sorting every symbol in Python
+    base_query = db.query(
+        latest.c.symbol, latest.c.daily_return, latest.c.close, latest.c.date
+    ).filter(
+        latest.c.rn == 1,
+        latest.c.daily_return.isnot(None)
+    )
     
-    gainers = sorted_data[:limit]
-    losers = sorted_data[-limit:] if len(sorted_data) >= limit else sorted_data
-    losers.reverse()  # Show worst first
+    gainers = base_query.order_by(latest.c.daily_return.desc()).limit(limit).all()
+    losers = base_query.order_by(latest.c.daily_return.asc()).limit(limit).all()  # Worst first
     
     return gainers, losers
 
 def get_most_volatile(db: Session, limit: int = 10):
     """Get most volatile stocks based on volatility score"""
-    subquery = db.query(
-        models.StockData.symbol,
-        func.max(models.StockData.date).label('max_date')
-    ).group_by(models.StockData.symbol).subquery()
-    
-    latest_data = db.query(models.StockData).join(
-        subquery,
-        (models.StockData.symbol == subquery.c.symbol) &
-        (models.StockData.date == subquery.c.max_date)
-    ).filter(models.StockData.volatility_score.isnot(None)).all()
+    latest = _latest_stock_data_subquery()
     
-    sorted_data = sorted(
-        latest_data, 
-        key=lambda x: x.volatility_score or 0, 
-        reverse=True
-    )
-    
-    return sorted_data[:limit]
-
+    return db.query(
+        latest.c.symbol, latest.c.volatility_score, latest.c.close, latest.c.date
+    ).filter(
+        latest.c.rn == 1,
+        latest.c.volatility_score.isnot(None)
+    ).order_by(latest.c.volatility_score.desc()).limit(limit).all()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -16,8 +16,33 @@ if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
         DATABASE_URL, connect_args={"check_same_thread": False}
     )
+    
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL so readers don't block the ingestion writer; larger page cache + mmap"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        cursor.execute("PRAGMA cache_size=-65536")  # 64 MB
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
 else:
-    engine = create_engine(DATABASE_URL)
+    engine_kwargs = {}
+    if DATABASE_URL.startswith(("postgresql://", "postgresql+psycopg2://")):
+        # Let psycopg2 send bulk inserts as multi-row VALUES batches
+        engine_kwargs["executemany_mode"] = "values_plus_batch"
+    
+    # Size the connection pool explicitly so concurrent requests don't queue
+    # on the default pool (size=5, max_overflow=10)
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "25")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "25")),
+        pool_pre_ping=True,
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        **engine_kwargs
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
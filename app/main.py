@@ -1,18 +1,22 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from app.database import engine, Base, SessionLocal
 from app.routers import companies, data, insights
 from app import crud, schemas
 from app.services.data_collector import get_all_companies
+from contextlib import asynccontextmanager
+from sqlalchemy import text
+import asyncio
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Arbitrary app-wide key for the PostgreSQL advisory lock guarding company seeding
+COMPANY_INIT_LOCK_KEY = 804201
 
 # Auto-initialize companies on startup (if not already initialized)
 def init_companies_on_startup():
@@ -20,16 +24,29 @@ def init_companies_on_startup():
     try:
         db = SessionLocal()
         try:
+            if engine.dialect.name == "postgresql":
+                # Only one worker seeds; the lock is released when the transaction ends
+                acquired = db.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:key)"),
+                    {"key": COMPANY_INIT_LOCK_KEY}
+                ).scalar()
+                if not acquired:
+                    logger.info("Another worker is initializing companies")
+                    return
+            
             # Check if companies exist
             existing_companies = crud.get_companies(db, limit=1)
             if not existing_companies:
                 logger.info("No companies found. Initializing companies...")
                 companies = get_all_companies()
-                for company_data in companies:
-                    existing = crud.get_company(db, symbol=company_data["symbol"])
-                    if not existing:
-                        company = schemas.CompanyBase(**company_data)
-                        crud.create_company(db, company)
+                existing_symbols = crud.get_existing_company_symbols(
+                    db, [c["symbol"] for c in companies]
+                )
+                to_insert = [
+                    schemas.CompanyBase(**c).dict()
+                    for c in companies if c["symbol"] not in existing_symbols
+                ]
+                crud.bulk_create_companies(db, to_insert)
                 logger.info(f"Initialized {len(companies)} companies")
             else:
                 logger.info("Companies already initialized")
@@ -39,8 +56,12 @@ def init_companies_on_startup():
         logger.warning(f"Could not auto-initialize companies: {str(e)}")
         # Don't fail startup if initialization fails
 
-# Run initialization
-init_companies_on_startup()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create tables and seed companies at startup, off the import path"""
+    Base.metadata.create_all(bind=engine)
+    await asyncio.to_thread(init_companies_on_startup)
+    yield
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -48,7 +69,9 @@ app = FastAPI(
     description="A comprehensive API for stock market data, analysis, and predictions",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -71,6 +94,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses (insights/compare payloads repeat the same keys);
+# a low level keeps the CPU cost small while getting most of the size win
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=4)
+
 # Include routers
 app.include_router(companies.router)
 app.include_router(data.router)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index, text
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -35,6 +35,18 @@ class StockData(Base):
     # Composite index for efficient queries
     __table_args__ = (
         Index('idx_symbol_date', 'symbol', 'date', unique=True),
+        # Covering index so latest-per-symbol lookups are index-only scans (PostgreSQL)
+        Index(
+            'idx_symbol_date_covering',
+            'symbol',
+            text('date DESC'),
+            postgresql_include=[
+                'daily_return', 'volatility_score', 'close',
+                'open', 'high', 'low', 'volume'
+            ]
+        ).ddl_if(dialect='postgresql'),
+        # SQLite has no INCLUDE; a plain date index helps ORDER BY date DESC
+        Index('idx_date_desc', 'date').ddl_if(dialect='sqlite'),
     )
     
     def __repr__(self):
@@ -4,9 +4,9 @@ from typing import List, Optional
 from datetime import date, timedelta
 from app import crud, schemas
 from app.database import get_db
-from app.services.data_processor import calculate_correlation
-from app.cache import cache
-import pandas as pd
+from app.services.data_processor import calculate_correlation_arrays
+from app.cache import cached
+import numpy as np
 
 router = APIRouter(prefix="/data", tags=["data"])
 
@@ -14,6 +14,7 @@ router = APIRouter(prefix="/data", tags=["data"])
 # Order matters in FastAPI!
 
 @router.get("/compare", response_model=schemas.ComparisonResponse)
+@cached("compare", schemas.ComparisonResponse, ttl=300, key_params=("symbol1", "symbol2", "days"))  # 5 minutes
 async def compare_stocks(
     symbol1: str = Query(..., description="First stock symbol"),
     symbol2: str = Query(..., description="Second stock symbol"),
@@ -21,33 +22,23 @@ async def compare_stocks(
     db: Session = Depends(get_db)
 ):
     """Compare two stocks' performance"""
-    # Check cache
-    cached = cache.get("compare", symbol1=symbol1, symbol2=symbol2, days=days)
-    if cached is not None:
-        return cached
-    
     # Get data for both symbols
-    data1 = crud.get_stock_data(db, symbol=symbol1, days=days)
-    data2 = crud.get_stock_data(db, symbol=symbol2, days=days)
+    data1 = crud.get_stock_data_columns(db, symbol=symbol1, days=days)
+    data2 = crud.get_stock_data_columns(db, symbol=symbol2, days=days)
     
-    if not data1:
+    if not data1['dates']:
         raise HTTPException(status_code=404, detail=f"No data found for {symbol1}")
-    if not data2:
+    if not data2['dates']:
         raise HTTPException(status_code=404, detail=f"No data found for {symbol2}")
     
-    # Convert to DataFrames for correlation calculation
-    df1 = pd.DataFrame([{
-        'date': d.date,
-        'close': d.close
-    } for d in data1])
-    
-    df2 = pd.DataFrame([{
-        'date': d.date,
-        'close': d.close
-    } for d in data2])
+    # Build NumPy arrays for correlation calculation (no DataFrame overhead)
+    dates1 = np.array(data1['dates'], dtype='datetime64[D]')
+    dates2 = np.array(data2['dates'], dtype='datetime64[D]')
+    closes1 = np.array(data1['close'], dtype=np.float64)
+    closes2 = np.array(data2['close'], dtype=np.float64)
     
     # Calculate correlation
-    correlation = calculate_correlation(df1, df2)
+    correlation = calculate_correlation_arrays(dates1, closes1, dates2, closes2)
     
     # Get summaries
     summary1 = crud.get_stock_summary(db, symbol=symbol1)
@@ -58,7 +49,7 @@ async def compare_stocks(
     if not summary2:
         raise HTTPException(status_code=404, detail=f"No summary found for {symbol2}")
     
-    result = schemas.ComparisonResponse(
+    return schemas.ComparisonResponse(
         symbol1=symbol1,
         symbol2=symbol2,
         correlation=correlation,
@@ -67,19 +58,11 @@ async def compare_stocks(
         symbol1_summary=summary1,
         symbol2_summary=summary2
     )
-    
-    # Cache for 5 minutes
-    cache.set("compare", result, ttl=300, symbol1=symbol1, symbol2=symbol2, days=days)
-    return result
 
 @router.get("/summary/{symbol}", response_model=schemas.StockSummary)
+@cached("stock_summary", schemas.StockSummary, ttl=600, key_params=("symbol",))  # 10 minutes
 async def get_stock_summary(symbol: str, db: Session = Depends(get_db)):
     """Get 52-week high, low, and average close for a symbol"""
-    # Check cache
-    cached = cache.get("stock_summary", symbol=symbol)
-    if cached is not None:
-        return cached
-    
     summary = crud.get_stock_summary(db, symbol=symbol)
     if summary is None:
         # Check if company exists
@@ -94,23 +77,17 @@ async def get_stock_summary(symbol: str, db: Session = Depends(get_db)):
             detail=f"No summary found for {symbol}. Please collect data first: /insights/collect-data"
         )
     
-    # Cache for 10 minutes
-    cache.set("stock_summary", summary, ttl=600, symbol=symbol)
     return summary
 
 @router.get("/{symbol}", response_model=List[schemas.StockData])
+@cached("stock_data", List[schemas.StockData], ttl=300, key_params=("symbol", "days"))  # 5 minutes
 async def get_stock_data(
     symbol: str,
     days: int = Query(30, ge=1, le=365, description="Number of days of data"),
     db: Session = Depends(get_db)
 ):
     """Get stock data for a symbol (last N days)"""
-    # Check cache
-    cached = cache.get("stock_data", symbol=symbol, days=days)
-    if cached is not None:
-        return cached
-    
-    stock_data = crud.get_stock_data(db, symbol=symbol, days=days)
+    stock_data = crud.get_stock_data_rows(db, symbol=symbol, days=days)
     if not stock_data:
         # Check if company exists
         company = crud.get_company(db, symbol=symbol)
@@ -124,6 +101,4 @@ async def get_stock_data(
             detail=f"No stock data found for {symbol}. Please collect data first: /insights/collect-data"
         )
     
-    # Cache for 5 minutes
-    cache.set("stock_data", stock_data, ttl=300, symbol=symbol, days=days)
     return stock_data
@@ -1,32 +1,42 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import date, datetime
 from app import crud, schemas
 from app.database import get_db
+from app.services.data_collector import fetch_stock_data, fetch_stock_data_bulk, get_all_companies, get_all_company_symbols
+from app.services.data_processor import clean_and_process_data, prepare_data_for_db, calculate_52_week_high_low
 from app.services.ml_predictor import get_predictor
-from app.cache import cache
+from app.cache import cached
 from typing import List, Optional
+import asyncio
 import logging
+import orjson
+import pandas as pd
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/insights", tags=["insights"])
 
+async def get_request_time() -> datetime:
+    """Dependency for a single timestamp shared by everything in one request (async so it runs inline, not in the threadpool)"""
+    return datetime.now()
+
 @router.get("", response_model=schemas.InsightResponse)
+@cached("insights", schemas.InsightResponse, ttl=120, key_params=("limit",))  # 2 minutes
 async def get_insights(
     limit: int = 10,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    now: datetime = Depends(get_request_time)
 ):
     """Get market insights: top gainers, losers, and most volatile stocks"""
-    # Check cache
-    cached = cache.get("insights", limit=limit)
-    if cached is not None:
-        return cached
+    def load():
+        return crud.get_top_gainers_losers(db, limit=limit), crud.get_most_volatile(db, limit=limit)
     
-    gainers, losers = crud.get_top_gainers_losers(db, limit=limit)
-    volatile = crud.get_most_volatile(db, limit=limit)
+    # Sync queries run in a worker thread so they don't block the event loop
+    (gainers, losers), volatile = await asyncio.to_thread(load)
     
-    result = schemas.InsightResponse(
+    return schemas.InsightResponse(
         top_gainers=[
             {
                 "symbol": g.symbol,
@@ -54,47 +64,33 @@ async def get_insights(
             }
             for v in volatile
         ],
-        last_updated=datetime.now()
+        last_updated=now
     )
-    
-    # Cache for 2 minutes (insights change frequently)
-    cache.set("insights", result, ttl=120, limit=limit)
-    return result
 
 @router.get("/predict/{symbol}", response_model=schemas.PredictionResponse)
+@cached("prediction", schemas.PredictionResponse, ttl=3600, key_params=("symbol",))  # 1 hour
 async def predict_price(
     symbol: str,
     db: Session = Depends(get_db)
 ):
     """Get price prediction for a stock using ML"""
-    # Check cache (predictions cached for 1 hour)
-    cached = cache.get("prediction", symbol=symbol)
-    if cached is not None:
-        return cached
-    
-    # Get historical data
-    stock_data = crud.get_stock_data(db, symbol=symbol, days=100)
+    # Get historical data as column arrays (sync query, off the event loop)
+    arrays = await asyncio.to_thread(crud.get_stock_arrays, db, symbol=symbol, days=100)
     
-    if not stock_data:
+    if len(arrays['close']) == 0:
         raise HTTPException(
             status_code=404,
             detail=f"No data found for symbol {symbol}"
         )
     
-    # Convert to DataFrame
-    import pandas as pd
-    df = pd.DataFrame([{
-        'date': d.date,
-        'close': d.close,
-        'open': d.open,
-        'high': d.high,
-        'low': d.low,
-        'volume': d.volume
-    } for d in stock_data])
+    # Typed arrays hit pandas' fast block-construction path; reversed views
+    # put the frame in ascending date order so the predictor needn't sort it
+    df = pd.DataFrame({column: values[::-1] for column, values in arrays.items()})
     
     # Get prediction
-    predictor = get_predictor()
-    predicted_price, confidence = predictor.predict_with_confidence(df)
+    # A cold symbol loads or trains (and saves) its model, so keep it off the event loop
+    predictor = get_predictor(symbol)
+    predicted_price, confidence = await asyncio.to_thread(predictor.predict_with_confidence, df)
     
     if predicted_price is None:
         raise HTTPException(
@@ -102,37 +98,32 @@ async def predict_price(
             detail="Failed to generate prediction"
         )
     
-    # Get current price
-    current_price = stock_data[0].close if stock_data else 0.0
+    # Get current price (arrays are newest first)
+    current_price = float(arrays['close'][0])
     
-    result = schemas.PredictionResponse(
+    return schemas.PredictionResponse(
         symbol=symbol,
         current_price=current_price,
         predicted_price=predicted_price,
         confidence=confidence,
-        prediction_date=datetime.now().date()
+        prediction_date=date.today()
     )
-    
-    # Cache for 1 hour (predictions don't change frequently)
-    cache.set("prediction", result, ttl=3600, symbol=symbol)
-    return result
 
 @router.get("/init-db")
 async def initialize_database(db: Session = Depends(get_db)):
     """Initialize database and seed companies (safe to call multiple times). Can be accessed via browser."""
     try:
-        from app.services.data_collector import get_all_companies
-        from app import crud, schemas
-        
         companies = get_all_companies()
-        added_count = 0
         
-        for company_data in companies:
-            existing = crud.get_company(db, symbol=company_data["symbol"])
-            if not existing:
-                company = schemas.CompanyBase(**company_data)
-                crud.create_company(db, company)
-                added_count += 1
+        # One IN query for existing symbols, then one bulk insert for the rest
+        existing_symbols = crud.get_existing_company_symbols(
+            db, [c["symbol"] for c in companies]
+        )
+        to_add = [
+            schemas.CompanyBase(**c).dict()
+            for c in companies if c["symbol"] not in existing_symbols
+        ]
+        added_count = crud.bulk_create_companies(db, to_add)
         
         return {
             "message": "Database initialized successfully",
@@ -143,17 +134,23 @@ async def initialize_database(db: Session = Depends(get_db)):
         logger.error(f"Error initializing database: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to initialize database: {str(e)}")
 
+# Max symbols processed at the same time by /collect-data
+COLLECT_CONCURRENCY = 16
+
 @router.get("/collect-data")
 async def trigger_data_collection(
     symbol: str = Query(None, description="Optional: specific symbol to collect data for. If not provided, collects for all companies."),
     db: Session = Depends(get_db)
 ):
-    """Trigger data collection for all companies or a specific symbol. Can be accessed via browser."""
+    """
+    Trigger data collection for all companies or a specific symbol. Can be accessed via browser.
+    Streams NDJSON: one line per symbol as it completes, then a summary line.
+    """
+    # Unknown symbols would otherwise be filled with mock data by the fallback
+    if symbol and symbol not in get_all_company_symbols():
+        raise HTTPException(status_code=404, detail="Company not found")
+    
     try:
-        from app.services.data_collector import fetch_stock_data, get_all_companies
-        from app.services.data_processor import clean_and_process_data, prepare_data_for_db, calculate_52_week_high_low
-        from app import crud, schemas
-        
         if symbol:
             # Collect data for specific symbol
             companies = [{"symbol": symbol}]
@@ -161,43 +158,45 @@ async def trigger_data_collection(
             # Collect data for all companies
             companies = get_all_companies()
         
-        results = []
-        for company in companies:
-            sym = company["symbol"]
+        def fetch_and_process(sym: str, df: Optional[pd.DataFrame]):
+            """Blocking fetch + processing for one symbol (runs in a worker thread)"""
+            # Symbols missing from the batched download are refetched on their own
+            # (downloads are serialized inside fetch_stock_data)
+            if df is None:
+                df = fetch_stock_data(sym, period="1y", use_mock_fallback=True)
+            
+            if df is None or df.empty:
+                return None, None, "No data fetched"
+            
+            # Process data
+            df = clean_and_process_data(df)
+            
+            if df.empty:
+                return None, None, "No data after processing"
+            
+            # Prepare for database
+            records = prepare_data_for_db(df, sym)
+            
+            if not records:
+                return None, None, "No records to insert"
+            
+            return df, records, None
+        
+        semaphore = asyncio.Semaphore(COLLECT_CONCURRENCY)
+        
+        async def collect_one(sym: str, prefetched: Optional[pd.DataFrame]) -> dict:
             try:
                 logger.info(f"Collecting data for {sym}...")
                 
-                # Fetch data
-                df = fetch_stock_data(sym, period="1y", use_mock_fallback=True)
-                
-                if df is None or df.empty:
-                    results.append({"symbol": sym, "status": "failed", "reason": "No data fetched"})
-                    continue
-                
-                # Process data
-                df = clean_and_process_data(df)
-                
-                if df.empty:
-                    results.append({"symbol": sym, "status": "failed", "reason": "No data after processing"})
-                    continue
+                async with semaphore:
+                    df, records, reason = await asyncio.to_thread(fetch_and_process, sym, prefetched)
                 
-                # Prepare for database
-                records = prepare_data_for_db(df, sym)
+                if reason:
+                    return {"symbol": sym, "status": "failed", "reason": reason}
                 
-                if not records:
-                    results.append({"symbol": sym, "status": "failed", "reason": "No records to insert"})
-                    continue
-                
-                # Insert data
-                inserted_count = 0
-                for record in records:
-                    try:
-                        stock_data = schemas.StockDataBase(**record)
-                        crud.create_stock_data(db, stock_data)
-                        inserted_count += 1
-                    except Exception as e:
-                        logger.debug(f"Error inserting record: {str(e)}")
-                        continue
+                # DB writes below never await, so tasks use the shared session one at a time
+                # Records come typed from prepare_data_for_db, so skip schema validation
+                inserted_count = crud.bulk_upsert_stock_data(db, records)
                 
                 # Calculate and store summary
                 summary_data = calculate_52_week_high_low(df)
@@ -212,20 +211,48 @@ async def trigger_data_collection(
                 )
                 
                 crud.create_or_update_stock_summary(db, summary)
-                results.append({"symbol": sym, "status": "success", "records": inserted_count})
+                return {"symbol": sym, "status": "success", "records": inserted_count}
                 
             except Exception as e:
+                db.rollback()
                 logger.error(f"Error collecting data for {sym}: {str(e)}")
-                results.append({"symbol": sym, "status": "error", "error": str(e)})
+                return {"symbol": sym, "status": "error", "error": str(e)}
         
-        success_count = sum(1 for r in results if r["status"] == "success")
-        return {
-            "message": "Data collection completed",
-            "total": len(companies),
-            "success": success_count,
-            "failed": len(companies) - success_count,
-            "results": results
-        }
+        async def stream_results():
+            # Download every symbol in one batched call, process them concurrently
+            # (bounded by the semaphore) and emit one NDJSON line per symbol as it
+            # finishes, then a summary line
+            symbols = [c["symbol"] for c in companies]
+            frames = await asyncio.to_thread(fetch_stock_data_bulk, symbols, "1y")
+            tasks = [asyncio.create_task(collect_one(sym, frames[sym])) for sym in symbols]
+            success_count = 0
+            try:
+                for next_result in asyncio.as_completed(tasks):
+                    result = await next_result
+                    if result["status"] == "success":
+                        success_count += 1
+                    yield orjson.dumps(result) + b"\n"
+            finally:
+                # On client disconnect the generator is cancelled; stop the remaining
+                # tasks before get_db closes the session they write through
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            
+            yield orjson.dumps({
+                "message": "Data collection completed",
+                "total": len(companies),
+                "success": success_count,
+                "failed": len(companies) - success_count
+            }) + b"\n"
+        
+        # An explicit Content-Encoding makes GZipMiddleware pass the stream through,
+        # otherwise progress lines would sit in the compressor until it flushes
+        return StreamingResponse(
+            stream_results(),
+            media_type="application/x-ndjson",
+            headers={"Content-Encoding": "identity"}
+        )
         
     except Exception as e:
         logger.error(f"Error in data collection endpoint: {str(e)}")
@@ -247,8 +274,7 @@ async def check_data_status(
         
         # Check stock data
         if symbol:
-            stock_data = crud.get_stock_data(db, symbol=symbol, days=365)
-            stock_count = len(stock_data) if stock_data else 0
+            stock_count = crud.count_stock_data_by_symbol(db, [symbol], days=365).get(symbol, 0)
             summary = crud.get_stock_summary(db, symbol=symbol)
             return {
                 "initialized": companies_count > 0,
@@ -260,14 +286,12 @@ async def check_data_status(
                 "message": f"Symbol {symbol}: {stock_count} data points" if stock_count > 0 else f"Symbol {symbol}: No data found. Run /insights/collect-data"
             }
         else:
-            # Check all companies
-            total_data_points = 0
-            companies_with_data = 0
-            for company in companies[:10]:  # Check first 10
-                data = crud.get_stock_data(db, symbol=company.symbol, days=365)
-                if data:
-                    total_data_points += len(data)
-                    companies_with_data += 1
+            # Check first 10 companies with one aggregate query
+            counts = crud.count_stock_data_by_symbol(
+                db, [company.symbol for company in companies[:10]], days=365
+            )
+            total_data_points = sum(counts.values())
+            companies_with_data = len(counts)
             
             return {
                 "initialized": companies_count > 0,
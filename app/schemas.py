@@ -49,12 +49,22 @@ class StockSummary(StockSummaryBase):
     class Config:
         from_attributes = True
 
+# One symbol's stock data as parallel columns (newest first)
+class StockDataColumns(BaseModel):
+    dates: List[date]
+    open: List[float]
+    high: List[float]
+    low: List[float]
+    close: List[float]
+    volume: List[int]
+    daily_return: List[Optional[float]]
+
 class ComparisonResponse(BaseModel):
     symbol1: str
     symbol2: str
     correlation: float
-    symbol1_data: List[StockData]
-    symbol2_data: List[StockData]
+    symbol1_data: StockDataColumns
+    symbol2_data: StockDataColumns
     symbol1_summary: StockSummary
     symbol2_summary: StockSummary
 
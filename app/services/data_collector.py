@@ -2,18 +2,45 @@ import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta, date
-from typing import List, Optional
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+from types import MappingProxyType
+from functools import lru_cache
 import logging
+import os
 import time
 import random
+import threading
+import zlib
+from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+from app.services.file_utils import write_atomically
 
 logging.getLogger("yfinance").setLevel(logging.CRITICAL)
 
 
 logger = logging.getLogger(__name__)
 
+# On-disk cache of yfinance downloads; set YF_CACHE_DIR to "" to disable
+YF_CACHE_DIR = os.getenv("YF_CACHE_DIR", "cache")
+DAILY_CACHE_TTL = 12 * 3600  # daily and longer bars change at most once a day
+INTRADAY_CACHE_TTL = 3600
+DAILY_INTERVALS = {"1d", "5d", "1wk", "1mo", "3mo"}
+
+# One HTTP session for every yfinance call so repeated requests to Yahoo reuse
+# keep-alive connections instead of a fresh TCP+TLS handshake each time.
+# The pool is sized for yf.download's per-ticker threads plus the collector's workers
+HTTP_POOL_SIZE = 16
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE))
+
+# yf.download collects results in module-global state (shared._DFS/_ERRORS) that
+# each call resets, so concurrent downloads clobber each other; serialize them
+_DOWNLOAD_LOCK = threading.Lock()
+
 # Popular Indian stocks (NSE symbols with .NS suffix for yfinance)
-INDIAN_STOCKS = [
+# Read-only tuple of read-only mappings: shared by every caller, so nobody can mutate it
+INDIAN_STOCKS = tuple(MappingProxyType(company) for company in [
     {"symbol": "RELIANCE.NS", "name": "Reliance Industries", "exchange": "NSE", "sector": "Energy"},
     {"symbol": "TCS.NS", "name": "Tata Consultancy Services", "exchange": "NSE", "sector": "Technology"},
     {"symbol": "HDFCBANK.NS", "name": "HDFC Bank", "exchange": "NSE", "sector": "Financial"},
@@ -29,7 +56,36 @@ INDIAN_STOCKS = [
     {"symbol": "AXISBANK.NS", "name": "Axis Bank", "exchange": "NSE", "sector": "Financial"},
     {"symbol": "MARUTI.NS", "name": "Maruti Suzuki", "exchange": "NSE", "sector": "Automotive"},
     {"symbol": "TITAN.NS", "name": "Titan Company", "exchange": "NSE", "sector": "Retail"},
-]
+])
+
+# Mock-data base price per symbol (for realism)
+BASE_PRICES = {
+    "RELIANCE.NS": 2500,
+    "TCS.NS": 3500,
+    "HDFCBANK.NS": 1600,
+    "INFY.NS": 1500,
+    "ICICIBANK.NS": 900,
+    "HINDUNILVR.NS": 2400,
+    "BHARTIARTL.NS": 1100,
+    "SBIN.NS": 600,
+    "BAJFINANCE.NS": 7000,
+    "WIPRO.NS": 400,
+    "ITC.NS": 450,
+    "LT.NS": 3200,
+    "AXISBANK.NS": 1000,
+    "MARUTI.NS": 9500,
+    "TITAN.NS": 3200,
+}
+
+@lru_cache(maxsize=None)
+def _mock_seed(symbol: str) -> int:
+    """Per-symbol RNG seed; crc32 is stable across processes, unlike the salted hash()"""
+    return zlib.crc32(symbol.encode())
+
+@lru_cache(maxsize=8)
+def _business_days(start_date: date, end_date: date) -> pd.DatetimeIndex:
+    """Monday-Friday dates between start_date and end_date (inclusive), built once per window"""
+    return pd.date_range(start=start_date, end=end_date, freq='B')
 
 def generate_mock_data(symbol: str, days: int = 365) -> pd.DataFrame:
     """
@@ -38,80 +94,132 @@ def generate_mock_data(symbol: str, days: int = 365) -> pd.DataFrame:
     """
     logger.info(f"Generating mock data for {symbol} (fallback mode)")
     
-    # Base price varies by symbol (for realism)
-    base_prices = {
-        "RELIANCE.NS": 2500,
-        "TCS.NS": 3500,
-        "HDFCBANK.NS": 1600,
-        "INFY.NS": 1500,
-        "ICICIBANK.NS": 900,
-        "HINDUNILVR.NS": 2400,
-        "BHARTIARTL.NS": 1100,
-        "SBIN.NS": 600,
-        "BAJFINANCE.NS": 7000,
-        "WIPRO.NS": 400,
-        "ITC.NS": 450,
-        "LT.NS": 3200,
-        "AXISBANK.NS": 1000,
-        "MARUTI.NS": 9500,
-        "TITAN.NS": 3200,
-    }
-    
-    base_price = base_prices.get(symbol, 1000)
+    base_price = BASE_PRICES.get(symbol, 1000)
     
     # Generate dates
     end_date = date.today()
     start_date = end_date - timedelta(days=days)
-    dates = pd.date_range(start=start_date, end=end_date, freq='D')
-    # Filter to business days only (Monday-Friday)
-    dates = dates[dates.weekday < 5]
+    # Business days only (Monday-Friday), shared by every symbol for the same window
+    dates = _business_days(start_date, end_date)
     
     n_days = len(dates)
     
     # Generate price series with random walk and trend
-    np.random.seed(hash(symbol) % 2**32)  # Deterministic seed based on symbol
+    rng = np.random.default_rng(_mock_seed(symbol))  # Deterministic seed based on symbol
     
     # Random walk with drift
-    returns = np.random.normal(0.0005, 0.02, n_days)  # Small positive drift, 2% volatility
+    returns = rng.normal(0.0005, 0.02, n_days)  # Small positive drift, 2% volatility
     prices = base_price * np.exp(np.cumsum(returns))
     
-    # Generate OHLC data
-    data = []
-    for i, (dt, close) in enumerate(zip(dates, prices)):
-        # Daily volatility
-        daily_vol = np.random.uniform(0.01, 0.03)
-        
-        # Generate open (slight variation from previous close)
-        if i == 0:
-            open_price = close * np.random.uniform(0.98, 1.02)
-        else:
-            open_price = prices[i-1] * np.random.uniform(0.99, 1.01)
-        
-        # Generate high and low
-        high = max(open_price, close) * (1 + np.random.uniform(0, daily_vol))
-        low = min(open_price, close) * (1 - np.random.uniform(0, daily_vol))
-        
-        # Ensure high >= max(open, close) and low <= min(open, close)
-        high = max(high, open_price, close)
-        low = min(low, open_price, close)
-        
-        # Generate volume (higher volume on volatile days)
-        volatility = abs(close - open_price) / open_price
-        base_volume = np.random.uniform(1000000, 5000000)
-        volume = int(base_volume * (1 + volatility * 2))
-        
-        data.append({
-            'date': dt.date(),
-            'open': round(open_price, 2),
-            'high': round(high, 2),
-            'low': round(low, 2),
-            'close': round(close, 2),
-            'volume': volume
-        })
+    # Generate OHLC data for all days at once
+    # Daily volatility
+    daily_vol = rng.uniform(0.01, 0.03, n_days)
     
-    df = pd.DataFrame(data)
+    # Generate open (slight variation from previous close; wider on the first day)
+    open_mult = rng.uniform(0.99, 1.01, n_days)
+    open_mult[0] = rng.uniform(0.98, 1.02)
+    opens = np.empty(n_days)
+    opens[0] = prices[0] * open_mult[0]
+    opens[1:] = prices[:-1] * open_mult[1:]
+    
+    # Generate high and low (always >= max(open, close) and <= min(open, close))
+    highs = np.maximum(opens, prices) * (1 + rng.uniform(0, daily_vol))
+    lows = np.minimum(opens, prices) * (1 - rng.uniform(0, daily_vol))
+    
+    # Generate volume (higher volume on volatile days)
+    rel_move = np.abs(prices - opens) / opens
+    base_volume = rng.uniform(1000000, 5000000, n_days)
+    volumes = (base_volume * (1 + 2 * rel_move)).astype(np.int64)
+    
+    df = pd.DataFrame({
+        'date': dates.date,
+        'open': np.round(opens, 2),
+        'high': np.round(highs, 2),
+        'low': np.round(lows, 2),
+        'close': np.round(prices, 2),
+        'volume': volumes
+    })
     return df
 
+def _normalize_download(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize one symbol's yf.download frame: lower-case OHLCV columns and a
+    'date' column of datetime.date. Raises ValueError if columns are missing
+    """
+    # Handle MultiIndex columns (yf.download can return MultiIndex)
+    if isinstance(data.columns, pd.MultiIndex):
+        # Flatten MultiIndex columns
+        data.columns = [col[0].lower() if isinstance(col, tuple) else str(col).lower() 
+                       for col in data.columns]
+    else:
+        # Normalize columns
+        data.columns = [str(c).lower() for c in data.columns]
+
+    # Ensure we have the required columns
+    required_cols = {"open", "high", "low", "close", "volume"}
+    available_cols = set(data.columns)
+    if not required_cols.issubset(available_cols):
+        # Try to find columns with different casing or names
+        col_mapping = {}
+        for req_col in required_cols:
+            for avail_col in available_cols:
+                if req_col in str(avail_col).lower():
+                    col_mapping[req_col] = avail_col
+                    break
+
+        if len(col_mapping) < len(required_cols):
+            raise ValueError(f"Missing required columns. Available: {available_cols}, Required: {required_cols}")
+
+        # Rename columns to standard names
+        data.rename(columns=col_mapping, inplace=True)
+
+    data.reset_index(inplace=True)
+    # The index keeps yfinance's capitalized name ("Date"/"Datetime")
+    data.rename(columns={"Date": "date", "Datetime": "datetime"}, inplace=True)
+
+    # Handle Date / Datetime index safely
+    if "date" in data.columns:
+        data["date"] = pd.to_datetime(data["date"]).dt.date
+    elif "datetime" in data.columns:
+        data.rename(columns={"datetime": "date"}, inplace=True)
+        data["date"] = pd.to_datetime(data["date"]).dt.date
+
+    return data
+
+def _download_cache_path(symbol: str, period: str, interval: str) -> Optional[Path]:
+    """Cache file for one download, keyed by symbol, period, interval and today's date"""
+    if not YF_CACHE_DIR:
+        return None
+    return Path(YF_CACHE_DIR) / f"{symbol}_{period}_{interval}_{date.today()}.pkl"
+
+def _read_download_cache(symbol: str, period: str, interval: str) -> Optional[pd.DataFrame]:
+    """Return a cached normalized download if it is younger than its TTL"""
+    path = _download_cache_path(symbol, period, interval)
+    if path is None:
+        return None
+    ttl = DAILY_CACHE_TTL if interval in DAILY_INTERVALS else INTRADAY_CACHE_TTL
+    try:
+        if time.time() - path.stat().st_mtime >= ttl:
+            return None
+        data = pd.read_pickle(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache file {path}: {str(e)[:100]}")
+        return None
+    logger.info(f"Loaded {len(data)} cached records for {symbol}")
+    return data
+
+def _write_download_cache(data: pd.DataFrame, symbol: str, period: str, interval: str):
+    """Store a normalized download for later _read_download_cache calls"""
+    path = _download_cache_path(symbol, period, interval)
+    if path is None:
+        return
+    try:
+        write_atomically(path, data.to_pickle)
+    except Exception as e:
+        logger.warning(f"Could not cache download for {symbol}: {str(e)[:100]}")
+
 def fetch_stock_data(
     symbol: str, 
     period: str = "1y",
@@ -119,6 +227,10 @@ def fetch_stock_data(
     use_mock_fallback: bool = True
 ) -> Optional[pd.DataFrame]:
 
+    cached = _read_download_cache(symbol, period, interval)
+    if cached is not None:
+        return cached
+
     max_retries = 2
     retry_delay = 1
 
@@ -128,54 +240,23 @@ def fetch_stock_data(
                 time.sleep(retry_delay)
 
             # ✅ USE download instead of Ticker().history()
-            data = yf.download(
-                symbol,
-                period=period,
-                interval=interval,
-                threads=False,       # CRITICAL
-                auto_adjust=False,
-                progress=False
-            )
+            with _DOWNLOAD_LOCK:
+                data = yf.download(
+                    symbol,
+                    period=period,
+                    interval=interval,
+                    threads=False,       # CRITICAL
+                    auto_adjust=False,
+                    progress=False,
+                    session=_SESSION
+                )
 
             # Hard fail if Yahoo returns junk
             if data is None or data.empty:
                 raise ValueError("Empty dataframe from yfinance")
 
-            # Handle MultiIndex columns (yf.download can return MultiIndex)
-            if isinstance(data.columns, pd.MultiIndex):
-                # Flatten MultiIndex columns
-                data.columns = [col[0].lower() if isinstance(col, tuple) else str(col).lower() 
-                               for col in data.columns]
-            else:
-                # Normalize columns
-                data.columns = [str(c).lower() for c in data.columns]
-
-            # Ensure we have the required columns
-            required_cols = {"open", "high", "low", "close", "volume"}
-            available_cols = set(data.columns)
-            if not required_cols.issubset(available_cols):
-                # Try to find columns with different casing or names
-                col_mapping = {}
-                for req_col in required_cols:
-                    for avail_col in available_cols:
-                        if req_col in str(avail_col).lower():
-                            col_mapping[req_col] = avail_col
-                            break
-                
-                if len(col_mapping) < len(required_cols):
-                    raise ValueError(f"Missing required columns. Available: {available_cols}, Required: {required_cols}")
-                
-                # Rename columns to standard names
-                data.rename(columns=col_mapping, inplace=True)
-
-            data.reset_index(inplace=True)
-
-            # Handle Date / Datetime index safely
-            if "date" in data.columns:
-                data["date"] = pd.to_datetime(data["date"]).dt.date
-            elif "datetime" in data.columns:
-                data.rename(columns={"datetime": "date"}, inplace=True)
-                data["date"] = pd.to_datetime(data["date"]).dt.date
+            data = _normalize_download(data)
+            _write_download_cache(data, symbol, period, interval)
 
             logger.info(f"Successfully fetched {len(data)} records for {symbol}")
             return data
@@ -204,10 +285,70 @@ def fetch_stock_data(
 
     return None
 
+def fetch_stock_data_bulk(
+    symbols: List[str],
+    period: str = "1y",
+    interval: str = "1d"
+) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Fetch several symbols with a single yf.download call
+    Returns {symbol: DataFrame or None}; None marks symbols missing from the
+    batch (or a failed batch) so callers can fall back to fetch_stock_data
+    """
+    frames: Dict[str, Optional[pd.DataFrame]] = {
+        symbol: _read_download_cache(symbol, period, interval) for symbol in symbols
+    }
+    # Only download symbols without a fresh cached copy
+    symbols = [symbol for symbol, df in frames.items() if df is None]
+    if not symbols:
+        return frames
+    
+    try:
+        with _DOWNLOAD_LOCK:
+            data = yf.download(
+                symbols,
+                period=period,
+                interval=interval,
+                group_by="ticker",
+                threads=True,
+                auto_adjust=False,
+                progress=False,
+                session=_SESSION
+            )
+    except Exception as e:
+        logger.warning(f"Bulk download failed for {len(symbols)} symbols: {str(e)[:100]}")
+        return frames
+    
+    if data is None or data.empty:
+        logger.warning(f"Bulk download returned no data for {len(symbols)} symbols")
+        return frames
+    
+    for symbol in symbols:
+        try:
+            # A single-symbol download comes back with flat columns
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                df = data[symbol].dropna(how="all")
+            else:
+                df = data.dropna(how="all")
+            
+            if df.empty:
+                continue
+            
+            frames[symbol] = _normalize_download(df.copy())
+            _write_download_cache(frames[symbol], symbol, period, interval)
+        except Exception as e:
+            logger.warning(f"Error reading bulk data for {symbol}: {str(e)[:100]}")
+    
+    fetched = sum(1 for symbol in symbols if frames[symbol] is not None)
+    logger.info(f"Bulk download fetched {fetched}/{len(symbols)} symbols")
+    return frames
+
 def get_company_info(symbol: str) -> Optional[dict]:
     """Get company information"""
     try:
-        ticker = yf.Ticker(symbol)
+        ticker = yf.Ticker(symbol, session=_SESSION)
         info = ticker.info
         
         return {
@@ -220,7 +361,12 @@ def get_company_info(symbol: str) -> Optional[dict]:
         logger.error(f"Error fetching company info for {symbol}: {str(e)}")
         return None
 
-def get_all_companies() -> List[dict]:
+def get_all_companies() -> Tuple[Mapping[str, str], ...]:
     """Get list of all companies we track"""
     return INDIAN_STOCKS
 
+@lru_cache(maxsize=1)
+def get_all_company_symbols() -> FrozenSet[str]:
+    """Get the set of tracked symbols (built once) for O(1) membership checks"""
+    return frozenset(company["symbol"] for company in INDIAN_STOCKS)
+
@@ -1,7 +1,6 @@
 import pandas as pd
 import numpy as np
 from typing import List, Optional
-from datetime import date
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,13 +22,13 @@ def calculate_52_week_high_low(df: pd.DataFrame) -> dict:
     if df.empty or 'close' not in df.columns:
         return {"week_52_high": None, "week_52_low": None, "avg_close": None}
     
-    # Get last 52 weeks (approximately 252 trading days)
-    recent_data = df.tail(252) if len(df) > 252 else df
+    # Get last 52 weeks (approximately 252 trading days), all three stats in one agg call
+    stats = df.tail(252).agg({'high': 'max', 'low': 'min', 'close': 'mean'})
     
     return {
-        "week_52_high": float(recent_data['high'].max()),
-        "week_52_low": float(recent_data['low'].min()),
-        "avg_close": float(recent_data['close'].mean())
+        "week_52_high": float(stats['high']),
+        "week_52_low": float(stats['low']),
+        "avg_close": float(stats['close'])
     }
 
 def calculate_volatility_score(df: pd.DataFrame, window: int = 30) -> pd.DataFrame:
@@ -53,17 +52,22 @@ def calculate_sentiment_index(df: pd.DataFrame) -> pd.DataFrame:
     """
     if 'close' in df.columns and 'volume' in df.columns:
         # Price change
-        price_change = df['close'].pct_change().fillna(0)
+        price_change = df['close'].pct_change().fillna(0).to_numpy()
         
         # Volume change (normalized)
-        volume_change = df['volume'].pct_change().fillna(0)
+        volume_change = df['volume'].pct_change().fillna(0).to_numpy()
         
         # Combined sentiment (simple heuristic)
         # Positive if price up with volume, negative if price down with volume
-        sentiment = (price_change * 0.7) + (np.sign(price_change) * volume_change * 0.3)
+        # Computed in place on raw arrays: one buffer instead of a Series per step
+        sentiment = np.sign(price_change)
+        sentiment *= volume_change
+        sentiment *= 0.3
+        sentiment += price_change * 0.7
         
         # Scale to -100 to 100
-        df['sentiment_index'] = sentiment * 100
+        sentiment *= 100
+        df['sentiment_index'] = sentiment
         
         # Smooth with moving average
         df['sentiment_index'] = df['sentiment_index'].rolling(window=5, min_periods=1).mean()
@@ -72,26 +76,42 @@ def calculate_sentiment_index(df: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
+def calculate_correlation_arrays(
+    dates1: np.ndarray,
+    closes1: np.ndarray,
+    dates2: np.ndarray,
+    closes2: np.ndarray
+) -> float:
+    """
+    Calculate correlation between two stocks' closing prices from NumPy arrays
+    Series are aligned on their common dates before correlating
+    """
+    if len(dates1) == 0 or len(dates2) == 0:
+        return 0.0
+    
+    dates1 = np.asarray(dates1, dtype='datetime64[D]')
+    dates2 = np.asarray(dates2, dtype='datetime64[D]')
+    _, idx1, idx2 = np.intersect1d(dates1, dates2, assume_unique=True, return_indices=True)
+    
+    if len(idx1) < 2:
+        return 0.0
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = np.corrcoef(closes1[idx1], closes2[idx2])[0, 1]
+    return float(correlation) if not np.isnan(correlation) else 0.0
+
 def calculate_correlation(df1: pd.DataFrame, df2: pd.DataFrame) -> float:
     """
     Calculate correlation between two stocks' closing prices
+    Kept for DataFrame callers; delegates to calculate_correlation_arrays
     """
     if df1.empty or df2.empty:
         return 0.0
     
-    # Merge on date
-    merged = pd.merge(
-        df1[['date', 'close']],
-        df2[['date', 'close']],
-        on='date',
-        suffixes=('_1', '_2')
+    return calculate_correlation_arrays(
+        df1['date'].to_numpy(), df1['close'].to_numpy(dtype=np.float64),
+        df2['date'].to_numpy(), df2['close'].to_numpy(dtype=np.float64)
     )
-    
-    if len(merged) < 2:
-        return 0.0
-    
-    correlation = merged['close_1'].corr(merged['close_2'])
-    return float(correlation) if not pd.isna(correlation) else 0.0
 
 def clean_and_process_data(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -111,19 +131,14 @@ def clean_and_process_data(df: pd.DataFrame) -> pd.DataFrame:
         df['date'] = pd.to_datetime(df['date']).dt.date
     
     # Handle missing values in OHLCV
-    numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-    for col in numeric_cols:
-        if col in df.columns:
-            # Forward fill, then backward fill
-            df[col] = df[col].ffill().bfill()
-            # If still NaN, fill with 0
-            df[col] = df[col].fillna(0)
-    
-    # Remove rows where close is 0 (invalid data)
-    df = df[df['close'] > 0]
+    numeric_cols = [col for col in ['open', 'high', 'low', 'close', 'volume'] if col in df.columns]
+    # Forward fill, then backward fill, then 0 for anything still NaN - all columns at once
+    df[numeric_cols] = df[numeric_cols].ffill().bfill().fillna(0)
     
-    # Sort by date
-    df = df.sort_values('date').reset_index(drop=True)
+    # Remove rows where close is 0 (invalid data), then sort by date;
+    # ignore_index renumbers during the sort instead of copying again.
+    # Everything downstream (metrics, ML features) relies on this ascending order
+    df = df[df['close'] > 0].sort_values('date', ignore_index=True)
     
     # Calculate metrics
     df = calculate_daily_return(df)
@@ -143,22 +158,23 @@ def prepare_data_for_db(df: pd.DataFrame, symbol: str) -> List[dict]:
     if df.empty:
         return []
     
-    records = []
-    for _, row in df.iterrows():
-        record = {
-            "symbol": symbol,
-            "date": row['date'] if isinstance(row['date'], date) else pd.to_datetime(row['date']).date(),
-            "open": float(row['open']),
-            "high": float(row['high']),
-            "low": float(row['low']),
-            "close": float(row['close']),
-            "volume": int(row['volume']),
-            "daily_return": float(row.get('daily_return', 0.0)),
-            "moving_avg_7": float(row.get('moving_avg_7', 0.0)),
-            "volatility_score": float(row.get('volatility_score', 0.0)),
-            "sentiment_index": float(row.get('sentiment_index', 0.0)),
-        }
-        records.append(record)
-    
-    return records
-
+    # Cast whole columns once into native Python lists, then zip them straight
+    # into row dicts - no per-cell casts and no intermediate DataFrame
+    n = len(df)
+    metric_cols = ['daily_return', 'moving_avg_7', 'volatility_score', 'sentiment_index']
+    columns = {
+        "symbol": [symbol] * n,
+        "date": pd.to_datetime(df['date']).dt.date.tolist(),
+        "open": df['open'].to_numpy(dtype=np.float64).tolist(),
+        "high": df['high'].to_numpy(dtype=np.float64).tolist(),
+        "low": df['low'].to_numpy(dtype=np.float64).tolist(),
+        "close": df['close'].to_numpy(dtype=np.float64).tolist(),
+        "volume": df['volume'].to_numpy(dtype=np.int64).tolist(),
+        **{
+            col: df[col].to_numpy(dtype=np.float64).tolist() if col in df.columns else [0.0] * n
+            for col in metric_cols
+        },
+    }
+    
+    keys = tuple(columns)
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
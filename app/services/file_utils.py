@@ -0,0 +1,19 @@
+from pathlib import Path
+from typing import Callable
+import os
+import threading
+
+def write_atomically(path: Path, write: Callable[[Path], None]):
+    """
+    Write a file via write(tmp_path), then rename it over path
+    Readers (other threads or workers) never see a partially written file;
+    the temp file is removed if writing fails
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
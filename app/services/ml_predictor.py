@@ -1,21 +1,148 @@
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from typing import Optional, Tuple
+from functools import lru_cache
+from pathlib import Path
+import joblib
 import logging
+import os
+import threading
 from datetime import date, timedelta
+from app.services.file_utils import write_atomically
 
 logger = logging.getLogger(__name__)
 
+# Trained models are persisted here (one file per symbol); set MODEL_DIR to "" to disable
+MODEL_DIR = os.getenv("MODEL_DIR", "models")
+
 class StockPricePredictor:
     """Simple ML model for stock price prediction"""
     
-    def __init__(self):
+    def __init__(self, model_path: Optional[Path] = None):
         self.model = LinearRegression()
-        self.scaler = StandardScaler()
+        # Feature standardization (fitted on the training split)
+        self.mean_: Optional[np.ndarray] = None
+        self.scale_: Optional[np.ndarray] = None
         self.is_trained = False
+        # Latest date in the data the model was trained on
+        self.trained_on: Optional[date] = None
+        self.model_path = model_path
+        self._load_attempted = False
+        # Shared per symbol and called from worker threads: one load/train/predict at a time
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _latest_date(df: pd.DataFrame) -> date:
+        return pd.Timestamp(df['date'].max()).date()
+    
+    def load(self) -> bool:
+        """Load a previously saved model from model_path, if there is one"""
+        if self.model_path is None or not self.model_path.exists():
+            return False
+        try:
+            state = joblib.load(self.model_path)
+            self.model = state["model"]
+            self.mean_ = state["mean"]
+            self.scale_ = state["scale"]
+            self.trained_on = state["trained_on"]
+            self.is_trained = True
+            return True
+        except Exception as e:
+            logger.warning(f"Could not load model from {self.model_path}: {str(e)}")
+            return False
+    
+    def save(self):
+        """Persist the trained model to model_path"""
+        if self.model_path is None:
+            return
+        state = {
+            "model": self.model,
+            "mean": self.mean_,
+            "scale": self.scale_,
+            "trained_on": self.trained_on
+        }
+        try:
+            write_atomically(self.model_path, lambda tmp_path: joblib.dump(state, tmp_path))
+        except Exception as e:
+            logger.warning(f"Could not save model to {self.model_path}: {str(e)}")
+    
+    def needs_training(self, df: pd.DataFrame) -> bool:
+        """True until trained, and again once df has data newer than the model"""
+        if not self.is_trained and not self._load_attempted:
+            self._load_attempted = True
+            self.load()
+        if not self.is_trained:
+            return True
+        return not df.empty and self._latest_date(df) > self.trained_on
+    
+    @staticmethod
+    def _feature_matrix(
+        past_prices: np.ndarray,
+        past_volumes: np.ndarray,
+        current_volume: np.ndarray
+    ) -> np.ndarray:
+        """
+        Build one feature row per window: past prices, 7/3-day averages,
+        average and current volume, and the returns within the window
+        """
+        # Moving averages
+        ma_7 = past_prices.mean(axis=1)
+        ma_3 = past_prices[:, -3:].mean(axis=1)
+        
+        # Volume features
+        avg_volume = past_volumes.mean(axis=1)
+        
+        # Return features (pct_change within each window, first day 0)
+        returns = np.zeros_like(past_prices)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[:, 1:] = past_prices[:, 1:] / past_prices[:, :-1] - 1
+        returns[np.isnan(returns)] = 0
+        
+        # Combine features
+        return np.column_stack([
+            past_prices,
+            ma_7, ma_3, avg_volume, current_volume,
+            returns
+        ])
+    
+    def fit_scaler(self, X) -> None:
+        """
+        Fit per-feature mean and standard deviation, open-coded instead of
+        sklearn's StandardScaler to skip its input validation on tiny matrices.
+        Uses the same corrected two-pass variance and near-constant feature
+        handling, so the scaled values are identical
+        """
+        X = np.asarray(X, dtype=np.float64)
+        n_samples = X.shape[0]
+        
+        mean = X.sum(axis=0) / n_samples
+        centered = X - mean
+        correction = centered.sum(axis=0)
+        centered **= 2
+        var = (centered.sum(axis=0) - correction ** 2 / n_samples) / n_samples
+        
+        # Near-constant features keep a scale of 1 to avoid dividing by ~0
+        eps = np.finfo(np.float64).eps
+        constant = var <= n_samples * eps * var + (n_samples * mean * eps) ** 2
+        scale = np.sqrt(var)
+        scale[constant] = 1.0
+        
+        self.mean_ = mean
+        self.scale_ = scale
+    
+    def scale(self, X) -> np.ndarray:
+        """Standardize features with the fitted mean and scale"""
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+    
+    @staticmethod
+    def _sorted_by_date(df: pd.DataFrame) -> pd.DataFrame:
+        """Return df in ascending date order, sorting only if it isn't already"""
+        if df.empty or df['date'].is_monotonic_increasing:
+            return df
+        return df.sort_values('date')
     
     def prepare_features(self, df: pd.DataFrame, lookback: int = 7) -> Tuple[pd.DataFrame, pd.Series]:
         """
@@ -25,39 +152,23 @@ class StockPricePredictor:
         if df.empty or len(df) < lookback + 1:
             return pd.DataFrame(), pd.Series()
         
-        df = df.copy().sort_values('date')
+        # Only columns are read, so an already-sorted frame is used as-is
+        df = self._sorted_by_date(df)
         
-        # Create features
-        features = []
-        targets = []
+        close = df['close'].to_numpy(dtype=np.float64)
+        volume = df['volume'].to_numpy()
         
-        for i in range(lookback, len(df)):
-            # Past prices
-            past_prices = df['close'].iloc[i-lookback:i].values
-            
-            # Moving averages
-            ma_7 = df['close'].iloc[i-lookback:i].mean()
-            ma_3 = df['close'].iloc[i-3:i].mean() if i >= 3 else df['close'].iloc[i-lookback:i].mean()
-            
-            # Volume features
-            avg_volume = df['volume'].iloc[i-lookback:i].mean()
-            current_volume = df['volume'].iloc[i]
-            
-            # Return features
-            returns = df['close'].iloc[i-lookback:i].pct_change().fillna(0).values
-            
-            # Combine features
-            feature_vector = np.concatenate([
-                past_prices,
-                [ma_7, ma_3, avg_volume, current_volume],
-                returns
-            ])
-            
-            features.append(feature_vector)
-            targets.append(df['close'].iloc[i])
+        # Row k holds the lookback days before target day lookback + k,
+        # built as strided views instead of slicing per sample
+        past_prices = sliding_window_view(close, lookback)[:-1]
+        past_volumes = sliding_window_view(volume, lookback)[:-1]
         
-        X = pd.DataFrame(features)
-        y = pd.Series(targets)
+        features = self._feature_matrix(past_prices, past_volumes, volume[lookback:])
+        
+        # Column-major like the frame pandas builds from per-row vectors; the
+        # features are collinear, so the least-squares fit is layout sensitive
+        X = pd.DataFrame(np.asfortranarray(features))
+        y = pd.Series(close[lookback:])
         
         return X, y
     
@@ -80,8 +191,9 @@ class StockPricePredictor:
             )
             
             # Scale features
-            X_train_scaled = self.scaler.fit_transform(X_train)
-            X_test_scaled = self.scaler.transform(X_test)
+            self.fit_scaler(X_train)
+            X_train_scaled = self.scale(X_train)
+            X_test_scaled = self.scale(X_test)
             
             # Train model
             self.model.fit(X_train_scaled, y_train)
@@ -91,6 +203,8 @@ class StockPricePredictor:
             logger.info(f"Model trained with R² score: {score:.4f}")
             
             self.is_trained = True
+            self.trained_on = self._latest_date(df)
+            self.save()
             return True
             
         except Exception as e:
@@ -102,8 +216,11 @@ class StockPricePredictor:
         Predict future price
         For simplicity, predict next day's price
         """
-        if not self.is_trained:
-            # Train on the fly
+        # Sort once up front; training and the feature builder reuse this frame
+        df = self._sorted_by_date(df)
+        
+        if self.needs_training(df):
+            # Train on the fly (first use, or newer data than the cached model)
             if not self.train(df):
                 return None
         
@@ -111,29 +228,23 @@ class StockPricePredictor:
             if df.empty or len(df) < 7:
                 return None
             
-            df = df.copy().sort_values('date')
-            
             # Get last lookback days
             lookback = 7
             if len(df) < lookback:
                 return None
             
-            # Prepare features from last data point
-            last_prices = df['close'].iloc[-lookback:].values
-            ma_7 = df['close'].iloc[-lookback:].mean()
-            ma_3 = df['close'].iloc[-3:].mean() if len(df) >= 3 else ma_7
-            avg_volume = df['volume'].iloc[-lookback:].mean()
-            current_volume = df['volume'].iloc[-1]
-            returns = df['close'].iloc[-lookback:].pct_change().fillna(0).values
-            
-            feature_vector = np.concatenate([
-                last_prices,
-                [ma_7, ma_3, avg_volume, current_volume],
-                returns
-            ]).reshape(1, -1)
+            # Prepare features from last data point (same builder as training,
+            # with the last day's volume standing in for the unknown next day's)
+            close = df['close'].to_numpy(dtype=np.float64)
+            volume = df['volume'].to_numpy()
+            feature_vector = self._feature_matrix(
+                close[-lookback:].reshape(1, -1),
+                volume[-lookback:].reshape(1, -1),
+                volume[-1:]
+            )
             
             # Scale and predict
-            feature_scaled = self.scaler.transform(feature_vector)
+            feature_scaled = self.scale(feature_vector)
             prediction = self.model.predict(feature_scaled)[0]
             
             return float(prediction)
@@ -147,7 +258,8 @@ class StockPricePredictor:
         Predict price with confidence score
         Confidence is based on model's R² score and data quality
         """
-        prediction = self.predict(df)
+        with self._lock:
+            prediction = self.predict(df)
         
         if prediction is None:
             return None, 0.0
@@ -159,10 +271,9 @@ class StockPricePredictor:
         
         return prediction, confidence
 
-# Global predictor instance
-_predictor = StockPricePredictor()
-
-def get_predictor() -> StockPricePredictor:
-    """Get the global predictor instance"""
-    return _predictor
+@lru_cache(maxsize=256)
+def get_predictor(symbol: str) -> StockPricePredictor:
+    """Get the predictor for a symbol (one per symbol per process, persisted under MODEL_DIR)"""
+    model_path = Path(MODEL_DIR) / f"{symbol}.joblib" if MODEL_DIR else None
+    return StockPricePredictor(model_path=model_path)
 
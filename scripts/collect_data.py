@@ -4,28 +4,83 @@ Collect and store stock market data
 import sys
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import List, Optional
+import pandas as pd
+from pydantic import TypeAdapter, ValidationError
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.database import SessionLocal
 from app import crud, schemas
-from app.services.data_collector import fetch_stock_data, get_all_companies
+from app.services.data_collector import fetch_stock_data, fetch_stock_data_bulk, get_all_companies
 from app.services.data_processor import clean_and_process_data, prepare_data_for_db, calculate_52_week_high_low
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def collect_stock_data(symbol: str, period: str = "1y", use_mock_fallback: bool = True):
-    """Collect and store data for a single stock"""
+# Symbols processed at the same time, and how many fallback fetches may start per second
+COLLECT_WORKERS = 8
+FETCH_RATE_PER_SEC = 5
+
+class _TokenBucket:
+    """Thread-safe token bucket: allows `rate` acquisitions per second on average"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Validates a whole batch of records in a single pydantic-core call
+_STOCK_RECORDS_ADAPTER = TypeAdapter(List[schemas.StockDataBase])
+
+def validate_stock_records(records: List[dict]) -> List[dict]:
+    """Validate stock data records and return them as plain dicts, skipping invalid ones"""
+    try:
+        return _STOCK_RECORDS_ADAPTER.dump_python(_STOCK_RECORDS_ADAPTER.validate_python(records))
+    except ValidationError:
+        # Fall back to per-record validation so one bad row doesn't drop the batch
+        valid_records = []
+        for record in records:
+            try:
+                valid_records.append(schemas.StockDataBase(**record).dict())
+            except ValidationError as e:
+                logger.debug(f"Error validating record: {str(e)}")
+        return valid_records
+
+def collect_stock_data(
+    symbol: str,
+    period: str = "1y",
+    use_mock_fallback: bool = True,
+    df: Optional[pd.DataFrame] = None
+):
+    """Collect and store data for a single stock (df: already-downloaded data, fetched if None)"""
     db = SessionLocal()
     try:
-        logger.info(f"Fetching data for {symbol}...")
-        
-        # Fetch data
-        df = fetch_stock_data(symbol, period=period, use_mock_fallback=use_mock_fallback)
+        if df is None:
+            logger.info(f"Fetching data for {symbol}...")
+            
+            # Fetch data
+            df = fetch_stock_data(symbol, period=period, use_mock_fallback=use_mock_fallback)
         
         if df is None or df.empty:
             logger.warning(f"No data fetched for {symbol}")
@@ -45,16 +100,11 @@ def collect_stock_data(symbol: str, period: str = "1y", use_mock_fallback: bool
             logger.warning(f"No records to insert for {symbol}")
             return False
         
-        # Insert data
-        inserted_count = 0
-        for record in records:
-            try:
-                stock_data = schemas.StockDataBase(**record)
-                crud.create_stock_data(db, stock_data)
-                inserted_count += 1
-            except Exception as e:
-                logger.debug(f"Error inserting record: {str(e)}")
-                continue
+        # Validate all records in one call; invalid ones are skipped
+        valid_records = validate_stock_records(records)
+        
+        # Insert data with one executemany upsert and a single commit
+        inserted_count = crud.bulk_upsert_stock_data(db, valid_records)
         
         logger.info(f"Inserted {inserted_count} records for {symbol}")
         
@@ -88,20 +138,42 @@ def collect_all_data(period: str = "1y", use_mock_fallback: bool = True):
     if use_mock_fallback:
         logger.info("Note: Mock data will be used as fallback if yfinance fails")
     
-    success_count = 0
-    for i, company in enumerate(companies, 1):
-        symbol = company["symbol"]
-        logger.info(f"[{i}/{len(companies)}] Processing {symbol}...")
-        
-        if collect_stock_data(symbol, period=period, use_mock_fallback=use_mock_fallback):
-            success_count += 1
-        
-        # Add delay between requests to avoid rate limiting
-        if i < len(companies):
-            time.sleep(1)  # 1 second delay between requests
+    # One batched download for every symbol; yf.download keeps results in
+    # module-level state, so concurrent per-symbol downloads can clobber each other
+    symbols = [company["symbol"] for company in companies]
+    frames = fetch_stock_data_bulk(symbols, period=period)
+    
+    # Symbols missing from the batch are refetched one at a time (with retry and
+    # mock fallback) under a rate limit, before any worker starts, for the same reason
+    rate_limiter = _TokenBucket(FETCH_RATE_PER_SEC)
+    for symbol in symbols:
+        if frames[symbol] is None:
+            rate_limiter.acquire()
+            logger.info(f"Fetching data for {symbol}...")
+            frames[symbol] = fetch_stock_data(symbol, period=period, use_mock_fallback=use_mock_fallback)
+            if frames[symbol] is None:
+                logger.warning(f"No data fetched for {symbol}")
+    
+    # Processing and DB writes run concurrently; each collect_stock_data call
+    # opens its own session, so workers never share one
+    def _collect_one(symbol: str) -> bool:
+        logger.info(f"Processing {symbol}...")
+        return collect_stock_data(symbol, period=period, use_mock_fallback=use_mock_fallback, df=frames[symbol])
+    
+    fetched = [symbol for symbol in symbols if frames[symbol] is not None]
+    with ThreadPoolExecutor(max_workers=COLLECT_WORKERS) as executor:
+        results = executor.map(_collect_one, fetched)
+        success_count = sum(1 for ok in results if ok)
     
     logger.info(f"Data collection complete! Successfully collected data for {success_count}/{len(companies)} companies")
 
+def run_collection(symbol: Optional[str] = None, period: str = "1y", use_mock_fallback: bool = True):
+    """Collect data for one symbol, or for all companies when symbol is None (importable entry point)"""
+    if symbol:
+        collect_stock_data(symbol, period=period, use_mock_fallback=use_mock_fallback)
+    else:
+        collect_all_data(period=period, use_mock_fallback=use_mock_fallback)
+
 if __name__ == "__main__":
     import argparse
     
@@ -130,13 +202,8 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
-    use_mock = not args.no_mock
-    
-    if args.symbol:
-        collect_stock_data(args.symbol, period=args.period, use_mock_fallback=use_mock)
-    elif args.all:
-        collect_all_data(period=args.period, use_mock_fallback=use_mock)
-    else:
+    if not args.symbol and not args.all:
         logger.info("Collecting data for all companies (default)...")
-        collect_all_data(period=args.period, use_mock_fallback=use_mock)
+    
+    run_collection(args.symbol, period=args.period, use_mock_fallback=not args.no_mock)
 